@@ -8,64 +8,406 @@ import os
 import re
 import sys
 import json
+import time
+import hashlib
+import threading
 import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
-import requests
+from urllib.parse import urlencode
+import urllib3
+from urllib3.util.retry import Retry
 
-def get_available_tags_from_dockerhub(image_name, max_tags=100):
-    """Get available tags for an image from Docker Hub."""
-    url = f"https://hub.docker.com/v2/repositories/helmhubio/{image_name}/tags"
-    params = {"page_size": max_tags}
+# Number of images whose tags are fetched concurrently
+MAX_WORKERS = 16
+
+# Tags requested per Docker Hub page
+PAGE_SIZE = 100
+
+# Times a rate-limited (429) request is retried after the shared pause
+RATE_LIMIT_RETRIES = 3
+
+# Longest rate-limit pause (seconds) worth waiting out; beyond it requests are
+# skipped and cached responses (if any) are used instead
+MAX_RATE_LIMIT_WAIT = 60
+
+# Docker Hub login endpoint; authenticated callers get higher rate limits
+DOCKERHUB_LOGIN_URL = "https://hub.docker.com/v2/users/login/"
+
+# Conditional-request (ETag) cache for Docker Hub responses
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "helmhubio" / "tags"
+
+# Shared pool so every fetch reuses keep-alive connections to Docker Hub.
+# Retries back off on server errors; rate limiting (429) is handled by
+# pause_on_rate_limit() so that all workers back off together.
+HTTP = urllib3.PoolManager(
+    num_pools=1,
+    maxsize=32,
+    retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        # Otherwise urllib3 retries any 429 carrying Retry-After on its own,
+        # behind the back of the shared pause
+        respect_retry_after_header=False,
+    ),
+)
+
+# Headers sent with every Docker Hub request (the JWT once logged in)
+AUTH_HEADERS = {}
+
+# Wall-clock time before which no worker may send a request (rate limited)
+_rate_limit_lock = threading.Lock()
+_resume_at = 0.0
+
+# Guards the one-time JWT refresh after a 401
+_auth_lock = threading.Lock()
+_token_refreshed = False
+
+def pause_on_rate_limit(response):
+    """Pause all workers if Docker Hub says we're out of quota or answered 429.
+    
+    Uses Retry-After on a 429, otherwise x-ratelimit-reset once
+    x-ratelimit-remaining hits zero.
+    """
+    global _resume_at
+    headers = response.headers
+    resume_at = None
+    try:
+        if response.status == 429:
+            resume_at = time.time() + int(headers.get("Retry-After", 1))
+        elif headers.get("x-ratelimit-remaining") == "0" and headers.get("x-ratelimit-reset"):
+            resume_at = float(headers["x-ratelimit-reset"])
+    except ValueError:
+        # Retry-After given as an HTTP date; back off briefly instead
+        resume_at = time.time() + 1
+    if resume_at is None:
+        return
+    with _rate_limit_lock:
+        if resume_at <= _resume_at:
+            # Another worker already announced this (or a later) pause
+            return
+        _resume_at = resume_at
+    until = time.strftime("%H:%M:%S", time.localtime(resume_at))
+    if resume_at - time.time() > MAX_RATE_LIMIT_WAIT:
+        print(f"   Docker Hub rate limit reached; skipping requests until {until}, using cached responses", file=sys.stderr)
+    else:
+        print(f"   Docker Hub rate limit reached; pausing requests until {until}", file=sys.stderr)
+
+def wait_for_rate_limit():
+    """Block until any pause set by pause_on_rate_limit() has elapsed.
+    
+    Returns False without waiting if the pause is longer than
+    MAX_RATE_LIMIT_WAIT; the caller should then not send the request.
+    """
+    with _rate_limit_lock:
+        delay = _resume_at - time.time()
+    if delay > MAX_RATE_LIMIT_WAIT:
+        return False
+    if delay > 0:
+        time.sleep(delay)
+    return True
+
+def login_to_dockerhub():
+    """Authenticate requests to Docker Hub for higher rate limits.
+    
+    Credentials come from DOCKERHUB_USER and DOCKERHUB_TOKEN (a password or
+    personal access token). Without them, requests stay anonymous.
+    Returns True if requests now carry a JWT.
+    """
+    username = os.environ.get("DOCKERHUB_USER")
+    password = os.environ.get("DOCKERHUB_TOKEN")
+    if not username or not password:
+        return False
+    
+    try:
+        response = HTTP.request(
+            "POST",
+            DOCKERHUB_LOGIN_URL,
+            body=json.dumps({"username": username, "password": password}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            timeout=10.0,
+        )
+        if response.status == 200:
+            token = json.loads(response.data).get("token")
+            if token:
+                AUTH_HEADERS["Authorization"] = f"JWT {token}"
+                return True
+        print(f"   Docker Hub login failed (HTTP {response.status}), continuing anonymously", file=sys.stderr)
+    except Exception as e:
+        print(f"   Docker Hub login failed: {e}, continuing anonymously", file=sys.stderr)
+    return False
+
+def refresh_dockerhub_token():
+    """Log in again after a 401 (expired JWT). Only attempted once per run."""
+    global _token_refreshed
+    with _auth_lock:
+        if _token_refreshed:
+            # Another worker already refreshed; retry if that left us authenticated
+            return "Authorization" in AUTH_HEADERS
+        _token_refreshed = True
+        if "Authorization" not in AUTH_HEADERS:
+            return False
+        if login_to_dockerhub():
+            return True
+        # The old JWT is expired; go on anonymously rather than keep sending it
+        AUTH_HEADERS.pop("Authorization", None)
+        return False
+
+def cache_path_for(url):
+    """Return the on-disk cache file for a fully-qualified request URL."""
+    return CACHE_DIR / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json"
+
+def get_json_cached(url, params=None):
+    """GET a JSON document, revalidating against the on-disk ETag cache.
+    
+    A 304 Not Modified reply is served from the cache (no body transfer and it
+    does not count against the Docker Hub quota). If the request fails, a
+    stale cached copy is returned when available. Returns None on non-200.
+    """
+    full_url = f"{url}?{urlencode(params)}" if params else url
+    cache_file = cache_path_for(full_url)
+    
+    cached = None
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = None
+    
+    headers = dict(AUTH_HEADERS)
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    
+    rate_limit_retries = 0
+    auth_refreshed = False
+    while True:
+        if not wait_for_rate_limit():
+            return cached["body"] if cached else None
+        try:
+            response = HTTP.request("GET", full_url, headers=headers, timeout=10.0)
+        except urllib3.exceptions.HTTPError:
+            if cached:
+                return cached["body"]
+            raise
+        pause_on_rate_limit(response)
+        if response.status == 401 and not auth_refreshed and refresh_dockerhub_token():
+            auth_refreshed = True
+            headers.update(AUTH_HEADERS)
+            continue
+        if response.status == 429 and rate_limit_retries < RATE_LIMIT_RETRIES:
+            rate_limit_retries += 1
+            continue
+        break
+    
+    if response.status in (304, 429) and cached:
+        # Not modified, or still rate limited: the cached copy is the best answer
+        return cached["body"]
+    if response.status != 200:
+        return None
+    
+    body = json.loads(response.data)
+    entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body": body,
+    }
+    if entry["etag"] or entry["last_modified"]:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(".tmp")
+            with open(tmp_file, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"   Warning: could not write cache {cache_file}: {e}", file=sys.stderr)
+    return body
+
+def tags_url(image_name):
+    """Docker Hub tag-listing endpoint for a helmhubio image."""
+    return f"https://hub.docker.com/v2/repositories/helmhubio/{image_name}/tags"
+
+def get_tags_page(image_name, url=None):
+    """Fetch one page of tags for an image.
+    
+    Returns (tags, next_url); next_url is None on the last page. Without a URL
+    the first page is fetched.
+    """
+    params = None
+    if url is None:
+        url = tags_url(image_name)
+        params = {"page_size": PAGE_SIZE}
     
     try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
+        data = get_json_cached(url, params=params)
+        if data is not None:
             tags = [result["name"] for result in data.get("results", [])]
-            return tags
+            return tags, data.get("next")
         else:
-            return []
+            return [], None
     except Exception as e:
         print(f"   Error fetching tags for {image_name}: {e}", file=sys.stderr)
-        return []
+        return [], None
 
-def find_best_matching_tag(missing_tag, available_tags):
-    """Find the best matching tag from available tags."""
-    # Extract version number from missing tag
-    # Example: "12.1.1-debian-12-r1" -> "12.1.1"
-    missing_version = missing_tag.split('-')[0]
+def iter_tags(image_name, first_page=None):
+    """Lazily yield every tag of an image, following Docker Hub's 'next' links.
     
-    # Try exact match first
-    if missing_tag in available_tags:
-        return missing_tag
+    Pages are only requested once the caller consumes the previous one, so a
+    caller that stops early never pays for the rest of the listing.
+    """
+    if first_page is None:
+        first_page = get_tags_page(image_name)
+    tags, next_url = first_page
+    yield from tags
+    while next_url:
+        tags, next_url = get_tags_page(image_name, next_url)
+        yield from tags
+
+class PagedTags:
+    """Re-iterable view over iter_tags(); each page is fetched at most once."""
     
-    # Try to find same major.minor version
-    major_minor = '.'.join(missing_version.split('.')[:2])
+    def __init__(self, tags):
+        self._source = iter(tags)
+        self._seen = []
     
-    # Find tags with same major.minor
-    candidates = []
-    for tag in available_tags:
-        if tag.startswith(major_minor):
-            candidates.append(tag)
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self._seen):
+                yield self._seen[i]
+                i += 1
+                continue
+            try:
+                tag = next(self._source)
+            except StopIteration:
+                return
+            self._seen.append(tag)
+
+def version_keys(tag):
+    """Return the (major.minor, major) lookup keys of a tag.
     
-    if candidates:
-        # Return the latest (first in list from Docker Hub)
-        return candidates[0]
+    Example: "12.1.1-debian-12-r1" -> ("12.1", "12")
+    """
+    version = tag.split('-')[0]
+    parts = version.split('.')
+    return '.'.join(parts[:2]), parts[0]
+
+def build_tag_index(tags):
+    """Index tags by exact name, major.minor and major in a single pass.
+    
+    Each version key maps to the first (i.e. latest, as Docker Hub lists newest
+    first) tag carrying it. "count" is the number of tags indexed, i.e. how
+    many leading tags a scan over the full listing can skip.
+    """
+    index = {"exact": set(), "major_minor": {}, "major": {}, "latest": None, "count": 0}
+    for tag in tags:
+        index["count"] += 1
+        major_minor, major = version_keys(tag)
+        index["exact"].add(tag)
+        index["major_minor"].setdefault(major_minor, tag)
+        index["major"].setdefault(major, tag)
+        if index["latest"] is None:
+            index["latest"] = tag
+    return index
+
+def find_best_matching_tag(missing_tag, available_tags, index=None):
+    """Find the best matching tag from available tags.
+    
+    available_tags may be any iterable (e.g. a lazily paged listing). Its
+    leading tags are looked up through index (built from the first PAGE_SIZE
+    when not given; pass one built from the first page to reuse it across the
+    missing tags of an image). Only when they hold no major.minor candidate are
+    the remaining tags streamed, stopping at the first exact or major.minor
+    match.
+    """
+    major_minor, major = version_keys(missing_tag)
+    # Read available_tags through a single iterator so one-shot iterables work too
+    tags = iter(available_tags)
+    if index is None:
+        index = build_tag_index(islice(tags, PAGE_SIZE))
+    else:
+        # The leading tags are already covered by the index
+        tags = islice(tags, index["count"], None)
+    
+    # Try exact match first, then same major.minor version
+    if missing_tag in index["exact"]:
+        return missing_tag
+    if major_minor in index["major_minor"]:
+        return index["major_minor"][major_minor]
     
-    # Try same major version
-    major = missing_version.split('.')[0]
-    for tag in available_tags:
-        if tag.startswith(f"{major}."):
+    same_major = index["major"].get(major)
+    latest = index["latest"]
+    for tag in tags:
+        if tag == missing_tag or version_keys(tag)[0] == major_minor:
             return tag
+        if same_major is None and version_keys(tag)[1] == major:
+            same_major = tag
     
-    # Return latest tag if nothing matches
-    if available_tags:
-        return available_tags[0]
+    # Fall back to same major version, then the latest tag
+    return same_major or latest
+
+# "repository: helmhubio/<image>" followed, within 5 lines and before the next
+# repository, by its "tag: <tag>"
+IMAGE_REF_RX = re.compile(
+    r"repository:\s*[\"']?helmhubio/([^\s\"']+)[^\n]*\n"
+    r"(?:(?![^\n]*repository:)[^\n]*\n){0,5}?"
+    r"\s*tag:\s*[\"']?([^\s\"'#]+)"
+)
+
+def build_image_index(charts_dir):
+    """Map (image_name, tag) to the chart directories whose values.yaml use it.
     
-    return None
+    Every values.yaml is read exactly once, so looking up the charts affected
+    by a missing tag no longer rescans the whole charts directory.
+    """
+    index = defaultdict(list)
+    for chart_dir in sorted(charts_dir.iterdir()):
+        if not chart_dir.is_dir() or chart_dir.name == "common":
+            continue
+        values_file = chart_dir / "values.yaml"
+        if not values_file.exists():
+            continue
+        with open(values_file, 'r') as f:
+            content = f.read()
+        for match in IMAGE_REF_RX.finditer(content):
+            charts = index[(match.group(1), match.group(2))]
+            if chart_dir not in charts:
+                charts.append(chart_dir)
+    return index
 
-def update_chart_image_tag(chart_path, image_name, old_tag, new_tag):
-    """Update image tag in Chart.yaml and values.yaml."""
+# Compiled tag-rewrite patterns, keyed by (image_name, old_tag)
+TAG_RX_CACHE = {}
+
+def tag_line_regex(image_name, old_tag):
+    """Pattern matching the tag of a helmhubio/<image> block when it is old_tag.
+    
+    Group 1 spans from the repository line up to the tag value, so the
+    replacement is m.group(1) + new_tag.
+    """
+    key = (image_name, old_tag)
+    rx = TAG_RX_CACHE.get(key)
+    if rx is None:
+        rx = re.compile(
+            rf"(repository:\s*[\"']?helmhubio/{re.escape(image_name)}(?![\w.-])[^\n]*\n"
+            r"(?:(?![^\n]*repository:)[^\n]*\n){0,5}?"
+            r"\s*tag:\s*[\"']?)"
+            rf"{re.escape(old_tag)}(?![\w.-])"
+        )
+        TAG_RX_CACHE[key] = rx
+    return rx
+
+def update_chart_image_tags(chart_path, replacements):
+    """Update image tags in Chart.yaml and values.yaml.
+    
+    replacements is a list of (image_name, old_tag, new_tag); each file is read
+    and written at most once no matter how many tags change in it.
+    """
     updated_files = []
     
     # Update Chart.yaml annotations
@@ -74,50 +416,31 @@ def update_chart_image_tag(chart_path, image_name, old_tag, new_tag):
         with open(chart_yaml, 'r') as f:
             content = f.read()
         
-        old_ref = f"docker.io/helmhubio/{image_name}:{old_tag}"
-        new_ref = f"docker.io/helmhubio/{image_name}:{new_tag}"
+        new_content = content
+        for image_name, old_tag, new_tag in replacements:
+            old_ref = f"docker.io/helmhubio/{image_name}:{old_tag}"
+            new_ref = f"docker.io/helmhubio/{image_name}:{new_tag}"
+            new_content = new_content.replace(old_ref, new_ref)
         
-        if old_ref in content:
-            content = content.replace(old_ref, new_ref)
+        if new_content != content:
             with open(chart_yaml, 'w') as f:
-                f.write(content)
+                f.write(new_content)
             updated_files.append("Chart.yaml")
     
     # Update values.yaml
     values_yaml = chart_path / "values.yaml"
     if values_yaml.exists():
         with open(values_yaml, 'r') as f:
-            lines = f.readlines()
+            content = f.read()
         
-        new_lines = []
-        in_image_section = False
-        found_repo = False
+        new_content = content
+        for image_name, old_tag, new_tag in replacements:
+            new_content = tag_line_regex(image_name, old_tag).sub(lambda m: m.group(1) + new_tag, new_content)
         
-        for i, line in enumerate(lines):
-            # Check if we're in the right image section
-            if f"repository: helmhubio/{image_name}" in line:
-                found_repo = True
-                new_lines.append(line)
-                continue
-            
-            # If we found the repo, look for tag within next 5 lines
-            if found_repo and "tag:" in line and old_tag in line:
-                # Replace the tag
-                new_line = line.replace(old_tag, new_tag)
-                new_lines.append(new_line)
-                updated_files.append("values.yaml")
-                found_repo = False
-                continue
-            
-            # Reset if we've gone too far
-            if found_repo and i > 5:
-                found_repo = False
-            
-            new_lines.append(line)
-        
-        if "values.yaml" in updated_files:
+        if new_content != content:
             with open(values_yaml, 'w') as f:
-                f.writelines(new_lines)
+                f.write(new_content)
+            updated_files.append("values.yaml")
     
     return updated_files
 
@@ -154,9 +477,27 @@ def main():
     # Get charts directory
     charts_dir = Path("/home/freeman/helmchart/charts/helmhubio")
     
+    # Index which charts use each image:tag (one read per values.yaml)
+    image_index = build_image_index(charts_dir)
+    
     total_fixed = 0
     total_checked = 0
     
+    # Tag rewrites collected per chart, applied in one pass per chart at the end
+    pending_updates = defaultdict(list)
+    
+    if login_to_dockerhub():
+        print("Authenticated to Docker Hub")
+    
+    # Fetch available tags from Docker Hub for all images in parallel
+    print(f"Fetching available tags for {len(missing_images)} images...")
+    first_pages = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(get_tags_page, name): name for name in missing_images}
+        for future in as_completed(futures):
+            first_pages[futures[future]] = future.result()
+    print()
+    
     print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
     print("Processing Images...")
     print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -166,40 +507,30 @@ def main():
         total_checked += 1
         print(f"[{total_checked}/{len(missing_images)}] {image_name}")
         
-        # Get available tags from Docker Hub
-        print(f"   Fetching available tags...", end=" ", flush=True)
-        available_tags = get_available_tags_from_dockerhub(image_name)
+        print(f"   Available tags...", end=" ", flush=True)
+        first_tags, next_url = first_pages[image_name]
         
-        if not available_tags:
+        if not first_tags:
             print(f"❌ No tags found")
             continue
         
-        print(f"✅ {len(available_tags)} tags found")
+        more = " (more pages available)" if next_url else ""
+        print(f"✅ {len(first_tags)} tags found{more}")
+        # Further pages are only fetched if a missing tag needs them
+        available_tags = PagedTags(iter_tags(image_name, first_pages[image_name]))
+        index = build_tag_index(first_tags)
         
         # For each missing tag, find a replacement
         for missing_tag in missing_tags:
-            best_match = find_best_matching_tag(missing_tag, available_tags)
+            best_match = find_best_matching_tag(missing_tag, available_tags, index)
             
             if best_match and best_match != missing_tag:
-                print(f"   {missing_tag} → {best_match}")
+                charts = image_index.get((image_name, missing_tag), [])
+                print(f"   {missing_tag} → {best_match} ({len(charts)} charts)")
                 
-                # Find charts using this image:tag
-                for chart_dir in charts_dir.iterdir():
-                    if not chart_dir.is_dir() or chart_dir.name == "common":
-                        continue
-                    
-                    # Check if chart uses this image
-                    values_file = chart_dir / "values.yaml"
-                    if values_file.exists():
-                        with open(values_file, 'r') as f:
-                            content = f.read()
-                        
-                        if f"helmhubio/{image_name}" in content and missing_tag in content:
-                            # Update the chart
-                            updated = update_chart_image_tag(chart_dir, image_name, missing_tag, best_match)
-                            if updated:
-                                print(f"      ✅ Updated {chart_dir.name}: {', '.join(updated)}")
-                                total_fixed += 1
+                # Queue the rewrite for every chart using this image:tag
+                for chart_dir in charts:
+                    pending_updates[chart_dir].append((image_name, missing_tag, best_match))
             elif best_match:
                 print(f"   {missing_tag} ✅ (exact match available)")
             else:
@@ -207,6 +538,20 @@ def main():
         
         print()
     
+    if pending_updates:
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        print("Updating Charts...")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        print()
+        
+        for chart_dir, replacements in sorted(pending_updates.items()):
+            updated = update_chart_image_tags(chart_dir, replacements)
+            if updated:
+                print(f"   ✅ Updated {chart_dir.name}: {', '.join(updated)} ({len(replacements)} tags)")
+                total_fixed += 1
+        
+        print()
+    
     print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
     print("Summary")
     print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
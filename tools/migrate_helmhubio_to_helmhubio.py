@@ -25,11 +25,13 @@ from __future__ import annotations
 
 import argparse
 import json
+import mmap
+import multiprocessing
 import os
 import re
 import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
 try:
     from ruamel.yaml import YAML
@@ -41,6 +43,16 @@ except Exception as e:
 ROOT = Path(__file__).resolve().parents[1]
 
 
+# Extensions of text-like files that get safe text replacement ("" = no extension)
+TEXT_EXTS = frozenset({".md", ".tpl", ".txt", ".yaml", ".yml", ".json", ".conf", ""})
+# Files updated structurally in step 1; skipped by the text pass to avoid duplicate writes
+STRUCTURED_YAML_NAMES = frozenset({"Chart.yaml", "values.yaml", "values.schema.json"})
+# Directories never descended into
+SKIP_DIRS = frozenset({".git", ".venv"})
+# rename_all_paths also leaves .github alone (do not rename .github itself)
+RENAME_SKIP_DIRS = SKIP_DIRS | {".github"}
+
+
 SAFE_TEXT_PATTERNS = [
     # Registry and chart repo changes
     (re.compile(r"oci://registry-1\.docker\.io/bitnamicharts"), "oci://registry-1.docker.io/helmhubiocharts"),
@@ -58,20 +70,90 @@ README_BRAND_PATTERNS = [
 ]
 
 
+def fuse_patterns(patterns: List[tuple[re.Pattern, str]]) -> re.Pattern:
+    """Combine (regex, replacement) pairs into one alternation so text is scanned once.
+    Each alternative is wrapped in a named group p<i> pointing back at its pair.
+
+    Unlike applying the pairs one after another, matches cannot overlap: text consumed
+    by one alternative is not seen by the others. E.g. in 'docker.io/bitnami/tree/main/bitnami/'
+    the docker.io match eats the '/' that '/(tree|blob)/(main|master)/bitnami/' needs, so
+    only the first part is rewritten. The pattern tables below don't overlap like that in
+    practice; keep it that way when adding entries.
+    """
+    return re.compile("|".join(f"(?P<p{i}>{rx.pattern})" for i, (rx, _) in enumerate(patterns)))
+
+
+def fused_sub(fused: re.Pattern, patterns: List[tuple[re.Pattern, str]], text: str) -> str:
+    def dispatch(m: re.Match) -> str:
+        # The wrapping group closes last, so lastgroup names the alternative that matched.
+        # Re-match with the original pattern so its own group numbers apply to the replacement.
+        rx, repl = patterns[int(m.lastgroup[1:])]
+        return rx.fullmatch(m.group()).expand(repl)
+
+    return fused.sub(dispatch, text)
+
+
+SAFE_TEXT_FUSED = fuse_patterns(SAFE_TEXT_PATTERNS)
+README_BRAND_FUSED = fuse_patterns(README_BRAND_PATTERNS)
+
+
+# Generic "bitnami/<repo>" mentions in docs and GitHub workflow/action files
+README_REPO_RX = re.compile(r"\bbitnami/([a-z0-9_.-]+)")
+GHA_REPO_RX = re.compile(r"\bbitnami/([A-Za-z0-9_.-]+)")
+
+
+# values.yaml 'repository:' lines (key optionally quoted) pointing at the old org; group 2 keeps an optional docker.io/ prefix
+VALUES_REPO_LINE_RX = re.compile(
+    rb"^([ \t]*(?:-[ \t]+)?[\"']?repository[\"']?[ \t]*:[ \t]*[\"']?)(docker\.io/)?(?:bitnami(?:legacy)?|helmhubiolegacy)/", re.M
+)
+# Any such reference outside a comment, wherever it sits on the line; used to detect
+# lines the regex above cannot handle (commented-out references are left alone by both)
+VALUES_REPO_MENTION_RX = re.compile(
+    rb"^[^#\n]*repository[\"']?[ \t]*:[ \t]*[\"']?(?:docker\.io/)?(?:bitnami(?:legacy)?|helmhubiolegacy)/", re.M
+)
+
+
+# Shared round-trip loader/dumper; building a YAML() registers all its (de)serializers,
+# so do it once. Files are processed serially per process (pool workers get their own copy).
+_YAML = YAML()
+_YAML.preserve_quotes = True
+_YAML.width = 4096
+
+# values.schema.json: JSON strings starting with the old org, and docker.io/<old org>/ anywhere
+SCHEMA_STRING_PREFIX_RX = re.compile(rb'"bitnami(?:legacy)?/')
+SCHEMA_DOCKER_IO_RX = re.compile(rb"docker\.io/(?:bitnami(?:legacy)?|helmhubiolegacy)/")
+
+# Byte markers: a file containing none of these has nothing for the rewrites below
+OLD_ORG_MARKERS = (b"bitnami", b"helmhubiolegacy")
+
+# Files at least this large are scanned for markers via mmap instead of being read whole
+MMAP_MIN_SIZE = 256 * 1024
+
+
+def read_if_contains(path: Path, needles: tuple[bytes, ...]) -> Optional[bytes]:
+    """Return the file's bytes if any of needles occurs in it, else None.
+    Large files are searched through a read-only mmap, so the common no-hit case
+    never copies them into memory.
+    """
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            raw = f.read()
+            return raw if any(n in raw for n in needles) else None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # 'needle in mm' only tests single bytes on mmap objects; find() does substrings
+            if all(mm.find(n) == -1 for n in needles):
+                return None
+            return mm[:]
+
+
 def load_yaml(path: Path) -> Any:
-    yaml = YAML()
-    yaml.preserve_quotes = True
-    yaml.width = 4096
     with path.open("r", encoding="utf-8") as f:
-        return yaml.load(f)
+        return _YAML.load(f)
 
 
 def dump_yaml(data: Any, path: Path):
-    yaml = YAML()
-    yaml.preserve_quotes = True
-    yaml.width = 4096
     with path.open("w", encoding="utf-8") as f:
-        yaml.dump(data, f)
+        _YAML.dump(data, f)
 
 
 def update_chart_yaml(path: Path) -> bool:
@@ -175,6 +257,28 @@ def update_chart_yaml(path: Path) -> bool:
 
 
 def update_values_yaml(path: Path) -> bool:
+    """Rewrite image repositories in values.yaml with a line-level regex.
+    Falls back to the ruamel.yaml round-trip when some repository reference is
+    not on a plain 'repository: <value>' line (e.g. flow-style mappings).
+    """
+    try:
+        raw = read_if_contains(path, OLD_ORG_MARKERS)
+    except Exception:
+        return False
+    if raw is None:
+        return False
+    new, count = VALUES_REPO_LINE_RX.subn(
+        lambda m: m.group(1) + (m.group(2) or b"") + b"helmhubio/", raw
+    )
+    if count != len(VALUES_REPO_MENTION_RX.findall(raw)):
+        return update_values_yaml_structured(path)
+    if new != raw:
+        path.write_bytes(new)
+        return True
+    return False
+
+
+def update_values_yaml_structured(path: Path) -> bool:
     try:
         data = load_yaml(path)
     except Exception:
@@ -217,6 +321,24 @@ def update_values_yaml(path: Path) -> bool:
 
 
 def update_values_schema_json(path: Path) -> bool:
+    """Rewrite image references in values.schema.json with byte regexes.
+    Avoids the json parse/re-serialize round-trip and keeps the original formatting.
+    """
+    try:
+        raw = read_if_contains(path, OLD_ORG_MARKERS)
+    except Exception:
+        return False
+    if raw is None:
+        return False
+    new = SCHEMA_STRING_PREFIX_RX.sub(b'"helmhubio/', raw)
+    new = SCHEMA_DOCKER_IO_RX.sub(b"docker.io/helmhubio/", new)
+    if new != raw:
+        path.write_bytes(new)
+        return True
+    return False
+
+
+def update_values_schema_json_structured(path: Path) -> bool:
     try:
         txt = path.read_text(encoding="utf-8")
         data = json.loads(txt)
@@ -253,27 +375,39 @@ def update_values_schema_json(path: Path) -> bool:
     return changed
 
 
+def run_update(job: tuple[Callable[[Path], bool], Path]) -> Optional[str]:
+    """Pool worker: apply one update_* function, returning the path if the file changed."""
+    update, path = job
+    return str(path) if update(path) else None
+
+
 def safe_text_replace(path: Path, readme_mode: bool = False) -> bool:
+    # Every pattern below needs 'bitnami' (or 'Bitnami' when rebranding docs); most files
+    # have neither, so a plain substring check skips the decode and regex passes for them.
     try:
-        text = path.read_text(encoding="utf-8")
+        raw = read_if_contains(path, (b"bitnami", b"Bitnami") if readme_mode else (b"bitnami",))
     except Exception:
         return False
+    if raw is None:
+        return False
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
     orig = text
 
     # Do not touch in-container paths
     # We simply avoid a global 'bitnami' replacement here. Only apply SAFE_TEXT_PATTERNS.
-    for rx, repl in SAFE_TEXT_PATTERNS:
-        text = rx.sub(repl, text)
+    text = fused_sub(SAFE_TEXT_FUSED, SAFE_TEXT_PATTERNS, text)
 
     if readme_mode:
-        for rx, repl in README_BRAND_PATTERNS:
-            text = rx.sub(repl, text)
+        text = fused_sub(README_BRAND_FUSED, README_BRAND_PATTERNS, text)
         # In docs, also rewrite generic repository mentions "bitnami/<repo>" -> "helmhubio/<repo>"
-        text = re.sub(r"\bbitnami/([a-z0-9_.-]+)", r"helmhubio/\1", text)
+        text = README_REPO_RX.sub(r"helmhubio/\1", text)
 
     # In GitHub workflow/action files, aggressively rewrite org/name usages like 'bitnami/xyz' -> 'helmhub-io/xyz'
     if ".github" in str(path):
-        text = re.sub(r"\bbitnami/([A-Za-z0-9_.-]+)", r"helmhub-io/\1", text)
+        text = GHA_REPO_RX.sub(r"helmhub-io/\1", text)
 
     if text != orig:
         path.write_text(text, encoding="utf-8")
@@ -298,13 +432,13 @@ def rename_all_paths(apply: bool) -> int:
     Skips .git, .venv, and hidden top-level control dirs.
     Returns number of renames performed (dry-run prints list).
     """
-    skip_dirs = {".git", ".venv", ".github"}  # do not rename .github itself
     renames: List[tuple[Path, Path]] = []
-    for root, dirs, files in os.walk(ROOT, topdown=False):
+    # Top-down so skipped subtrees can be pruned before descending; order doesn't
+    # matter because renames are sorted deepest-first below.
+    for root, dirs, files in os.walk(ROOT):
         rpath = Path(root)
         # skip .git and .venv subtrees entirely
-        if any(part in skip_dirs for part in rpath.parts):
-            continue
+        dirs[:] = [d for d in dirs if d not in RENAME_SKIP_DIRS]
         for name in dirs + files:
             if "bitnami" in name:
                 src = rpath / name
@@ -312,7 +446,7 @@ def rename_all_paths(apply: bool) -> int:
                 if src != dst:
                     renames.append((src, dst))
     # sort deepest paths first
-    renames.sort(key=lambda p: len(str(p[0])), reverse=True)
+    renames.sort(key=lambda t: -len(t[0].parts))
     count = 0
     for src, dst in renames:
         if apply:
@@ -328,6 +462,8 @@ def main():
     ap.add_argument("--rename-folders", action="store_true", help="Rename top-level 'bitnami' -> 'helmhubio'")
     ap.add_argument("--rename-all", action="store_true", help="Rename any file/dir names containing 'bitnami' -> 'helmhubio'")
     ap.add_argument("--root", default=None, help="Operate on this repo root instead of the script's parent")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes for Chart.yaml/values.yaml/values.schema.json updates (default: CPU count)")
+    ap.add_argument("--strict-json", action="store_true", help="Parse and re-serialize values.schema.json instead of regex rewriting (validates JSON, reformats file)")
     ap.add_argument("--rebrand", action="store_true", help="No-op flag (rebranding is applied by default); accepted for compatibility")
     args = ap.parse_args()
 
@@ -341,33 +477,35 @@ def main():
     # Determine which top-level chart dirs exist (pre or post rename)
     top_levels = [d for d in [ROOT/"bitnami", ROOT/"helmhubio"] if d.exists()]
 
-    # 1) YAML-aware updates
+    # 1) YAML-aware updates. Each file is independent, so parse/dump them across processes.
+    update_schema = update_values_schema_json_structured if args.strict_json else update_values_schema_json
+    jobs: List[tuple[Callable[[Path], bool], Path]] = []
     for tl in top_levels:
-        for chart_yaml in tl.glob("*/Chart.yaml"):
-            if update_chart_yaml(chart_yaml):
-                changed_files.append(str(chart_yaml))
-        for values_yaml in tl.glob("*/values.yaml"):
-            if update_values_yaml(values_yaml):
-                changed_files.append(str(values_yaml))
-        for schema_json in tl.glob("*/values.schema.json"):
-            if update_values_schema_json(schema_json):
-                changed_files.append(str(schema_json))
+        jobs += [(update_chart_yaml, p) for p in tl.glob("*/Chart.yaml")]
+        jobs += [(update_values_yaml, p) for p in tl.glob("*/values.yaml")]
+        jobs += [(update_schema, p) for p in tl.glob("*/values.schema.json")]
+    if args.jobs > 1 and len(jobs) > 1:
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = list(pool.imap(run_update, jobs, chunksize=8))
+    else:
+        results = [run_update(job) for job in jobs]
+    changed_files.extend(r for r in results if r)
 
     # 2) Safe text replacement across the whole repo (not only charts), excluding binary/hidden control dirs
     for root, dirs, files in os.walk(ROOT):
         rpath = Path(root)
-        if any(part in {".git", ".venv"} for part in rpath.parts):
-            continue
+        # Prune in place so os.walk never descends into .git/.venv
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
         for fname in files:
+            # os.walk already lists only non-directories in 'files'
             path = rpath / fname
-            if not path.is_file():
-                continue
+            suffix = path.suffix.lower()
             # Only process text-like files by extension
-            if path.suffix.lower() in {".md", ".tpl", ".txt", ".yaml", ".yml", ".json", ".conf", ""}:
-                # Skip YAML we handled structurally (Chart.yaml, values.yaml, values.schema.json) to avoid duplicate writes
-                if path.name in {"Chart.yaml", "values.yaml", "values.schema.json"}:
+            if suffix in TEXT_EXTS:
+                # Skip YAML we handled structurally to avoid duplicate writes
+                if fname in STRUCTURED_YAML_NAMES:
                     continue
-                readme_mode = path.suffix.lower() == ".md"
+                readme_mode = suffix == ".md"
                 if safe_text_replace(path, readme_mode=readme_mode):
                     changed_files.append(str(path))
 